@@ -1,13 +1,18 @@
 import pandas as pd
 
-df = pd.read_excel(excel_file_path)
+# The app passes the already parsed (and cached) sheet as `excel_df`;
+# `excel_file_path` is only for standalone use
+if "excel_df" in globals():
+    df = excel_df
+else:
+    df = pd.read_excel(excel_file_path)
 
 
 found_index = -1
-for index, row in df.iterrows():
-    if str(row.iloc[0]).lower().find(surname) != -1:
-        found_index = index
-        break # Stop the loop once the surname is found
+# Search the first column in one vectorized pass instead of iterrows
+matches = df.iloc[:, 0].astype(str).str.lower().str.contains(surname, regex=False)
+if matches.any():
+    found_index = matches.idxmax() # First row containing the surname
 
 if found_index != -1:
     morning = df.iloc[found_index - 1]
@@ -1,12 +1,12 @@
+import importlib.util
 import io
 import re
-import runpy
 from pathlib import Path
-from datetime import datetime, timezone
 
 import pandas as pd
 import streamlit as st
-from ics import Calendar, Event  # ✅ di nuovo con libreria ics
+
+from turni_ics import df_to_ics
 
 st.set_page_config(page_title="Convertitore Turni", page_icon="🗓️", layout="centered")
 st.title("Convertitore Turni")
@@ -20,67 +20,56 @@ surname_input = st.text_input("Cognome", help="Scrivi il tuo cognome completo. N
 run_btn = st.button("Converti")
 
 # Helper per sanitizzare i nomi file
+_SANITIZE_RE = re.compile(r"[^A-Za-z0-9_-]")
+
 def _sanitize(s: str) -> str:
     s = (s or "").strip()
     s = s.replace(" ", "_")
-    return re.sub(r"[^A-Za-z0-9_-]", "", s)
+    return _SANITIZE_RE.sub("", s)
+
+# --- Lettura Excel ---------------------------------------------------------
+# python-calamine è molto più veloce di openpyxl; se non è installato si ricade su openpyxl
+_EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+@st.cache_data(show_spinner=False)
+def _read_excel_cached(xlsx_bytes: bytes) -> pd.DataFrame:
+    # La chiave di cache è il contenuto del file: rieseguire con lo stesso file non lo rilegge
+    return pd.read_excel(io.BytesIO(xlsx_bytes), engine=_EXCEL_ENGINE)
 
 # --- Core runner ------------------------------------------------------------
-def run_conversion_script(script_path: Path, excel_path: Path, surname: str):
-    init_globals = {
+@st.cache_resource(show_spinner=False)
+def _load_compiled(script_path: str, mtime_ns: int):
+    # mtime_ns fa parte della chiave di cache: se lo script viene modificato si ricompila
+    return compile(Path(script_path).read_text(encoding="utf-8"), script_path, "exec")
+
+def run_conversion_script(script_path: Path, excel_bytes: bytes, xlsx_stem: str, surname: str):
+    base_globals = {
         "__name__": "__main__",
+        "__file__": str(script_path),
         "pd": pd,
         "surname": surname,
-        "excel_file_path": str(excel_path),
     }
 
-    exec_globals = runpy.run_path(str(script_path), init_globals=init_globals)
-    exec_globals["surname"] = surname
-
-    df_final = exec_globals.get("df_final")
-    return df_final, exec_globals
-
-# --- Generatore ICS (con libreria ics) -------------------------------------
-def csv_text_to_ics(csv_text: str) -> tuple[str, int]:
-    df = pd.read_csv(io.StringIO(csv_text))
-
-    subj = "Subject"
-    sd = "Start Date"
-    stime = "Start Time"
-    ed = "End Date"
-    etime = "End Time"
-
-    cal = Calendar()
-    for _, row in df.iterrows():
-        try:
-            subject = str(row[subj]).strip()
+    compiled = _load_compiled(str(script_path), script_path.stat().st_mtime_ns)
 
-            start_str = f"{row[sd]} {row[stime]}"
-            end_str = f"{row[ed]} {row[etime]}"
-
-            start_dt = pd.to_datetime(start_str, dayfirst=True, errors="coerce")
-            end_dt = pd.to_datetime(end_str, dayfirst=True, errors="coerce")
-
-            if pd.isna(start_dt) or pd.isna(end_dt):
-                continue
-
-            ev = Event(name=subject)
-            ev.begin = start_dt.to_pydatetime()
-            ev.end = end_dt.to_pydatetime()
-
-            if "Description" in df.columns and pd.notna(row.get("Description")):
-                ev.description = str(row["Description"])
-            if "Location" in df.columns and pd.notna(row.get("Location")):
-                ev.location = str(row["Location"])
-
-            # DTSTAMP richiesto da RFC 5545
-            ev.created = datetime.now(timezone.utc)
-
-            cal.events.add(ev)
-        except Exception:
-            continue
-
-    return str(cal), len(cal.events)
+    # Il foglio già letto (e in cache) resta in memoria: nessuna copia su disco
+    init_globals = {**base_globals, "excel_df": _read_excel_cached(excel_bytes)}
+    try:
+        exec(compiled, init_globals)
+    except NameError as e:
+        if e.name != "excel_file_path":
+            raise
+        # Lo script richiede un percorso: solo in questo caso si scrive il file su disco
+        tmp_dir = Path(st.session_state.get("_tmp_dir", ".tmp_uploads"))
+        tmp_dir.mkdir(exist_ok=True)
+        excel_path = tmp_dir / f"{xlsx_stem}.xlsx"
+        excel_path.write_bytes(excel_bytes)
+        init_globals = {**base_globals, "excel_file_path": str(excel_path)}
+        exec(compiled, init_globals)
+    init_globals["surname"] = surname
+
+    df_final = init_globals.get("df_final")
+    return df_final, init_globals
 
 # --- Azione principale ------------------------------------------------------
 if run_btn:
@@ -92,14 +81,13 @@ if run_btn:
         st.error("Per favore inserisci il tuo cognome.")
         st.stop()
 
-    tmp_dir = Path(st.session_state.get("_tmp_dir", ".tmp_uploads"))
-    tmp_dir.mkdir(exist_ok=True)
     xlsx_name = Path(uploaded_xlsx.name).stem
-    excel_path = tmp_dir / f"{_sanitize(xlsx_name)}.xlsx"
     excel_bytes = uploaded_xlsx.read()
-    excel_path.write_bytes(excel_bytes)
 
     surname = surname_input.strip().lower()
+    # Parti sanitizzate del nome file, calcolate una volta e riusate per CSV, ICS ed Excel temporaneo
+    sx = _sanitize(xlsx_name)
+    ss = _sanitize(surname)
 
     app_dir = Path(__file__).parent
     script_path = app_dir / "conversione_turni.py"
@@ -107,11 +95,11 @@ if run_btn:
     try:
         if not script_path.exists():
             st.warning("`conversione_turni.py` non è stato trovato accanto a questa app. Verrà utilizzato direttamente il contenuto del file Excel caricato come `df_final`.")
-            df_final = pd.read_excel(excel_path)
+            df_final = _read_excel_cached(excel_bytes)
         else:
             with st.spinner("Esecuzione di conversione_turni.py..."):
                 try:
-                    df_final, _ = run_conversion_script(script_path, excel_path, surname)
+                    df_final, _ = run_conversion_script(script_path, excel_bytes, sx, surname)
                 except NameError:
                     st.error("⚠️ Cognome non trovato nel file Excel.")
                     st.stop()
@@ -126,21 +114,20 @@ if run_btn:
         st.success("Conversione completata!")
         st.dataframe(df_final, use_container_width=True)
 
-        out_name_csv = f"{_sanitize(xlsx_name)}_{_sanitize(surname)}.csv"
-        out_name_ics = f"{_sanitize(xlsx_name)}_{_sanitize(surname)}.ics"
+        out_stem = f"{sx}_{ss}"
+        out_name_csv = f"{out_stem}.csv"
+        out_name_ics = f"{out_stem}.ics"
 
-        csv_buf = io.StringIO()
-        df_final.to_csv(csv_buf, index=False)
-        csv_text = csv_buf.getvalue()
+        csv_bytes = df_final.to_csv(index=False).encode("utf-8")
         st.download_button(
             label=f"Scarica {out_name_csv}",
-            data=csv_text.encode("utf-8"),
+            data=csv_bytes,
             file_name=out_name_csv,
             mime="text/csv",
         )
 
         try:
-            ics_str, n_events = csv_text_to_ics(csv_text)
+            ics_str, n_events = df_to_ics(df_final)
             st.download_button(
                 label=f"Scarica {out_name_ics}",
                 data=ics_str.encode("utf-8"),
@@ -151,11 +138,11 @@ if run_btn:
             if n_events == 0:
                 st.warning("Nessun evento rilevato per l'ICS. Controlla che le intestazioni del CSV rispettino lo schema (Subject, Start Date/Time, End Date/Time, ecc.).")
         except Exception as e:
-            st.warning(f"Impossibile generare ICS dal CSV: {e}")
+            st.warning(f"Impossibile generare ICS: {e}")
 
         save_path_csv = app_dir / out_name_csv
         try:
-            save_path_csv.write_text(csv_text, encoding="utf-8")
+            save_path_csv.write_bytes(csv_bytes)
             st.caption(f"Copia CSV salvata in: `{save_path_csv}`")
         except Exception:
             pass
@@ -0,0 +1,152 @@
+# Generazione del file ICS a partire dal DataFrame prodotto da conversione_turni.py.
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl  # opzionale: parsing delle date più veloce
+except ImportError:
+    pl = None
+
+SUBJ = "Subject"
+SD = "Start Date"
+STIME = "Start Time"
+ED = "End Date"
+ETIME = "End Time"
+ALLD = "All Day Event"
+
+# Formato prodotto da conversione_turni.py (es. "08-01-2024 8:00 AM")
+_DATE_FORMAT = "%d-%m-%Y"
+_DT_FORMAT = f"{_DATE_FORMAT} %I:%M %p"
+
+# Valori della colonna "All Day Event" considerati veri
+_TRUTHY = {"true", "1", "yes", "y", "si", "sì", "x"}
+
+def _parse_strings(s: pd.Series, fmt: str) -> pd.Series:
+    """Converte in blocco una colonna di stringhe (NaT se non interpretabili)."""
+    if pl is not None:
+        # Polars legge direttamente le stringhe Arrow e le converte in parallelo
+        parsed = pl.from_pandas(s).str.strptime(pl.Datetime, format=fmt, strict=False).to_pandas()
+        parsed.index = s.index
+    else:
+        parsed = pd.to_datetime(s, format=fmt, errors="coerce")
+    # Fallback sull'inferenza (più lenta) solo per le righe in un formato diverso.
+    # Nei turni le stesse date/ore si ripetono: ogni stringa viene interpretata una
+    # sola volta (anche quelle non valide, memorizzate come NaT).
+    missing = parsed.isna()
+    if missing.any():
+        cache: dict[str, pd.Timestamp] = {}
+        for key in s[missing].dropna().unique():
+            cache[key] = pd.to_datetime(key, dayfirst=True, errors="coerce")
+        parsed[missing] = s[missing].map(cache)
+    return parsed
+
+def _parse_datetimes(dates: pd.Series, times: pd.Series) -> pd.Series:
+    """Unisce data e ora e le converte in blocco."""
+    # Stringhe Arrow: la concatenazione avviene in C invece che oggetto per oggetto
+    s = dates.astype("string[pyarrow]") + " " + times.astype("string[pyarrow]")
+    return _parse_strings(s, _DT_FORMAT)
+
+def _ics_escape(value) -> str:
+    """Escape dei caratteri speciali nei campi di testo (RFC 5545, 3.3.11)."""
+    return (
+        str(value).strip()
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\n")
+        .replace("\r", "\n")
+        .replace("\n", "\\n")
+    )
+
+def _ics_text_column(col: pd.Series) -> np.ndarray:
+    """Testo escapato per ogni riga, calcolato una sola volta per valore distinto.
+
+    I turni ripetono pochi valori (es. "Mattina", "Pomeriggio"): tutte le righe
+    uguali condividono la stessa stringa. I valori mancanti diventano None.
+    """
+    codes, uniques = pd.factorize(col)
+    escaped = np.array([_ics_escape(v) for v in uniques] + [None], dtype=object)
+    # codes == -1 per i valori mancanti -> ultimo elemento (None)
+    return escaped[codes]
+
+def _format_events(df: pd.DataFrame, dtstamp: str) -> tuple[list[str], int]:
+    """Righe VEVENT per le righe del DataFrame e numero di eventi."""
+    start_series = _parse_datetimes(df[SD], df[STIME])
+    end_series = _parse_datetimes(df[ED], df[ETIME])
+
+    # Proprietà DTSTART/DTEND formattate sull'intera colonna invece che riga per riga
+    dtstart_arr = start_series.dt.strftime("DTSTART:%Y%m%dT%H%M%S").to_numpy(dtype=object)
+    dtend_arr = end_series.dt.strftime("DTEND:%Y%m%dT%H%M%S").to_numpy(dtype=object)
+    valid = (start_series.notna() & end_series.notna()).to_numpy()
+
+    # Maschera "giornata intera" calcolata sull'intera colonna
+    if ALLD in df.columns:
+        all_day_mask = df[ALLD].astype(str).str.strip().str.lower().isin(_TRUTHY).to_numpy()
+    else:
+        all_day_mask = np.zeros(len(df), dtype=bool)
+    if all_day_mask.any():
+        # Per gli eventi di un'intera giornata l'ora può mancare: contano solo le date.
+        # DTEND di un evento giornaliero è esclusivo: giorno successivo alla data di fine.
+        start_days = _parse_strings(df[SD].astype("string[pyarrow]"), _DATE_FORMAT)
+        end_days = _parse_strings(df[ED].astype("string[pyarrow]"), _DATE_FORMAT) + pd.Timedelta(days=1)
+        dtstart_arr = np.where(
+            all_day_mask,
+            start_days.dt.strftime("DTSTART;VALUE=DATE:%Y%m%d").to_numpy(dtype=object),
+            dtstart_arr,
+        )
+        dtend_arr = np.where(
+            all_day_mask,
+            end_days.dt.strftime("DTEND;VALUE=DATE:%Y%m%d").to_numpy(dtype=object),
+            dtend_arr,
+        )
+        valid = np.where(all_day_mask, (start_days.notna() & end_days.notna()).to_numpy(), valid)
+
+    # UID casuali (uuid4) generati con un'unica lettura da os.urandom
+    rnd = os.urandom(16 * len(df))
+    uids = [str(uuid.UUID(bytes=rnd[i:i + 16], version=4)) for i in range(0, len(rnd), 16)]
+
+    # Colonne estratte una volta sola: evita di costruire una Series per ogni riga
+    subj_arr = _ics_text_column(df[SUBJ])
+    desc_arr = _ics_text_column(df["Description"]) if "Description" in df.columns else None
+    loc_arr = _ics_text_column(df["Location"]) if "Location" in df.columns else None
+
+    lines: list[str] = []
+    n_events = 0
+    for i in range(len(df)):
+        if not valid[i]:
+            continue
+
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uids[i]}",
+            f"DTSTAMP:{dtstamp}",
+            dtstart_arr[i],
+            dtend_arr[i],
+            f"SUMMARY:{subj_arr[i] or ''}",
+        ]
+        if desc_arr is not None and desc_arr[i] is not None:
+            lines.append(f"DESCRIPTION:{desc_arr[i]}")
+        if loc_arr is not None and loc_arr[i] is not None:
+            lines.append(f"LOCATION:{loc_arr[i]}")
+        lines.append("END:VEVENT")
+        n_events += 1
+
+    return lines, n_events
+
+def df_to_ics(df: pd.DataFrame) -> tuple[str, int]:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Turni2ICS//EN"]
+    n_events = 0
+
+    if {SUBJ, SD, STIME, ED, ETIME}.issubset(df.columns):
+        # DTSTAMP richiesto da RFC 5545: identico per tutti gli eventi della stessa esportazione
+        dtstamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+        event_lines, n_events = _format_events(df, dtstamp)
+        lines += event_lines
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n", n_events